@@ -6,8 +6,15 @@ Supports the paint_color encoding used by Bambu Studio, OrcaSlicer,
 Snapmaker Orca, and compatible slicers.
 """
 
-from collections import Counter
-import colorsys
+import array
+import functools
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # Optional: JIT-compiles the long paint code scan
+    numba = None
 
 
 # Known Bambu Studio paint_color codes mapped to palette/extruder indices
@@ -51,27 +58,78 @@ BAMBU_PAINT_CODE_MAP = {
 # - 'C' followed by digit = extruder 3+ (C0=ext3, C1=ext4, etc.)
 # - digit followed by 'C' = same (0C=ext3, 1C=ext4, etc.)
 
+# Number of palette indices a long paint string can produce ('C9' -> 11)
+MAX_PAINT_INDEX_COUNT = 12
+
+# Marker for bytes that carry no color in the single-character table
+NO_COLOR = 0xFF
+
+
+def _build_single_char_table() -> bytes:
+    """Build a 256-entry byte -> palette index table for single nibbles."""
+    table = bytearray([NO_COLOR] * 256)
+    table[ord('0')] = 0  # Base/extruder 1
+    table[ord('4')] = 0  # Extruder 1
+    table[ord('3')] = 0  # Appears in combinations, treat as noise or base
+    table[ord('8')] = 1  # Extruder 2
+    return bytes(table)
+
+
+def _build_pair_table() -> dict[int, int]:
+    """Build a (byte1 << 8 | byte2) -> palette index table for 'C' pairs."""
+    table = {
+        (ord(key[0]) << 8) | ord(key[1]): value
+        for key, value in BAMBU_PAINT_CODE_MAP.items()
+        if len(key) == 2
+    }
+    # CX with a digit beyond the map (C8=ext11, C9=ext12)
+    for digit in range(10):
+        table.setdefault((ord('C') << 8) | ord(str(digit)), 2 + digit)
+    return table
+
+
+SINGLE_CHAR_TABLE = _build_single_char_table()
+PAIR_TABLE = _build_pair_table()
 
-def generate_distinct_colors(count: int) -> list[tuple[float, float, float, float]]:
+
+# Which of (value, q, p, t) feeds (r, g, b) in each HSV hue sector,
+# matching colorsys.hsv_to_rgb
+HSV_SECTOR_COMPONENTS = np.array([
+    (0, 3, 2),  # v, t, p
+    (1, 0, 2),  # q, v, p
+    (2, 0, 3),  # p, v, t
+    (2, 1, 0),  # p, q, v
+    (3, 2, 0),  # t, p, v
+    (0, 2, 1),  # v, p, q
+])
+
+
+def generate_distinct_colors(count: int) -> np.ndarray:
     """
-    Generate a list of visually distinct colors using HSV color space.
+    Generate an array of visually distinct colors using HSV color space.
     
-    Uses golden ratio to distribute hues evenly.
+    Uses golden ratio to distribute hues evenly. Returns a (count, 4)
+    float32 RGBA array.
     """
-    colors = []
     golden_ratio_conjugate = 0.618033988749895
-    hue = 0.0
+    steps = np.arange(count)
+    hue = (steps * golden_ratio_conjugate) % 1.0
     
-    for i in range(count):
-        # Vary saturation and value slightly for more distinction
-        saturation = 0.7 + (i % 3) * 0.1
-        value = 0.9 - (i % 2) * 0.15
-        
-        r, g, b = colorsys.hsv_to_rgb(hue, saturation, value)
-        colors.append((r, g, b, 1.0))
-        
-        hue = (hue + golden_ratio_conjugate) % 1.0
+    # Vary saturation and value slightly for more distinction
+    saturation = 0.7 + (steps % 3) * 0.1
+    value = 0.9 - (steps % 2) * 0.15
     
+    # Vectorized HSV -> RGB
+    sector = np.floor(hue * 6.0)
+    frac = hue * 6.0 - sector
+    p = value * (1.0 - saturation)
+    q = value * (1.0 - saturation * frac)
+    t = value * (1.0 - saturation * (1.0 - frac))
+    components = np.stack((value, q, p, t))
+    selected = HSV_SECTOR_COMPONENTS[sector.astype(np.intp) % 6]
+    
+    colors = np.ones((count, 4), dtype=np.float32)
+    colors[:, :3] = components[selected, steps[:, None]]
     return colors
 
 
@@ -94,18 +152,29 @@ def decode_paint_code(paint_code: str | None) -> int:
     if paint_code is None or paint_code == '':
         return 0  # Base color / extruder 1
     
-    code = paint_code.strip().upper()
+    # Codes are normally already stripped and upper-case; skip normalizing
+    # (two string allocations) when the raw value is a known short code
+    paint_idx = BAMBU_PAINT_CODE_MAP.get(paint_code)
+    if paint_idx is not None:
+        return paint_idx
+    
+    return _decode_normalized_paint_code(paint_code.strip().upper())
+
+
+@functools.lru_cache(maxsize=4096)
+def _decode_normalized_paint_code(code: str) -> int:
+    """
+    Decode a stripped, upper-case paint_color string to a palette index.
     
+    Results are memoized: real files repeat a small set of paint codes
+    across many triangles, so most calls are a cache hit.
+    """
     # Try known short codes first
     if code in BAMBU_PAINT_CODE_MAP:
         return BAMBU_PAINT_CODE_MAP[code]
     
-    # For very short codes (1-2 chars), try the mapping
+    # Unknown short code (1-2 chars) - default to base
     if len(code) <= 2:
-        for key, value in BAMBU_PAINT_CODE_MAP.items():
-            if key == code:
-                return value
-        # Unknown short code - default to base
         return 0
     
     # Long string: sub-triangle encoding
@@ -116,136 +185,281 @@ def decode_paint_code(paint_code: str | None) -> int:
     # - '8' = extruder 2 (index 1)  
     # - 'C' with digit = extruder 3+ (0C/C0=ext3, 1C/C1=ext4, etc.)
     
-    color_counts: Counter[int] = Counter()
+    # Scan as ASCII bytes; non-ASCII characters become '?' (no color) so
+    # pair boundaries stay aligned with the original characters
+    buf = code.encode('ascii', 'replace')
+    if _scan_long_code_jit is not None:
+        return int(_scan_long_code_jit(
+            np.frombuffer(buf, dtype=np.uint8), SINGLE_CHAR_ARRAY, PAIR_ARRAY
+        ))
+    return _scan_long_code(buf)
+
+
+def _scan_long_code(buf: bytes) -> int:
+    """Pure-Python scan of an ASCII long paint code to its dominant index."""
+    length = len(buf)
+    last = length - 1
+    single_table = SINGLE_CHAR_TABLE
+    pair_table = PAIR_TABLE
+
+    # Fixed-size tally indexed by palette index, plus the order in which
+    # indices were first seen (used to break ties like the original scan)
+    color_counts = [0] * MAX_PAINT_INDEX_COUNT
+    first_seen: list[int] = []
     i = 0
     
-    while i < len(code):
-        char = code[i]
-        
-        # Check for two-character patterns with 'C'
-        if i + 1 < len(code):
-            pair = code[i:i+2]
-            # Check both orderings: XC and CX
-            if pair in BAMBU_PAINT_CODE_MAP:
-                color_counts[BAMBU_PAINT_CODE_MAP[pair]] += 1
-                i += 2
-                continue
-            # Try reversed pair
-            reversed_pair = pair[1] + pair[0]
-            if reversed_pair in BAMBU_PAINT_CODE_MAP:
-                color_counts[BAMBU_PAINT_CODE_MAP[reversed_pair]] += 1
-                i += 2
-                continue
-        
-        # Single character interpretation
-        if char == '0':
-            color_counts[0] += 1  # Base/extruder 1
-        elif char == '4':
-            color_counts[0] += 1  # Extruder 1
-        elif char == '8':
-            color_counts[1] += 1  # Extruder 2
-        elif char == '3':
-            # '3' often appears in combinations, treat as noise or base
-            color_counts[0] += 1
-        elif char == 'C':
-            # Standalone C - might be part of a pair we missed
-            # Check if next char is a digit for CX pattern
-            if i + 1 < len(code) and code[i+1].isdigit():
-                digit = int(code[i+1])
-                color_counts[2 + digit] += 1  # C0=ext3, C1=ext4, etc.
+    while i < length:
+        # Two-character patterns with 'C' (XC and CX) take precedence
+        if i < last:
+            color_idx = pair_table.get((buf[i] << 8) | buf[i + 1], NO_COLOR)
+            if color_idx != NO_COLOR:
+                if not color_counts[color_idx]:
+                    first_seen.append(color_idx)
+                color_counts[color_idx] += 1
                 i += 2
                 continue
-            # Or previous char might form XC
-            # Just skip standalone C
-            pass
         
+        # Single character interpretation (standalone 'C' is skipped)
+        color_idx = single_table[buf[i]]
+        if color_idx != NO_COLOR:
+            if not color_counts[color_idx]:
+                first_seen.append(color_idx)
+            color_counts[color_idx] += 1
         i += 1
     
-    if not color_counts:
-        return 0  # No recognizable colors
-    
-    # Find the most common non-zero color (prefer painted over base)
-    non_zero_counts = {k: v for k, v in color_counts.items() if k != 0}
-    
-    if non_zero_counts:
-        # Return most frequent non-zero color
-        return max(non_zero_counts.keys(), key=lambda k: non_zero_counts[k])
-    else:
-        # Only base color found
-        return 0
+    # Find the most common non-zero color (prefer painted over base);
+    # ties go to the color seen first
+    best_idx = 0
+    best_count = 0
+    for color_idx in first_seen:
+        if color_idx != 0 and color_counts[color_idx] > best_count:
+            best_idx = color_idx
+            best_count = color_counts[color_idx]
+
+    # Only base color (or nothing recognizable) found -> 0
+    return best_idx
+
+
+if numba is not None:
+    # Dense table forms of the lookups, usable from nopython mode
+    SINGLE_CHAR_ARRAY = np.frombuffer(SINGLE_CHAR_TABLE, dtype=np.uint8)
+    PAIR_ARRAY = np.full(1 << 16, NO_COLOR, dtype=np.uint8)
+    for _pair_key, _pair_idx in PAIR_TABLE.items():
+        PAIR_ARRAY[_pair_key] = _pair_idx
 
+    @numba.njit(cache=True, nogil=True)
+    def _scan_long_code_jit(buf, single_table, pair_table):
+        """JIT-compiled equivalent of _scan_long_code over a uint8 array."""
+        length = buf.shape[0]
+        color_counts = np.zeros(MAX_PAINT_INDEX_COUNT, dtype=np.int32)
+        # Position of first occurrence per index (for tie-breaking)
+        first_pos = np.full(MAX_PAINT_INDEX_COUNT, length, dtype=np.int32)
+        i = 0
+        while i < length:
+            if i + 1 < length:
+                color_idx = pair_table[(np.int32(buf[i]) << 8) | buf[i + 1]]
+                if color_idx != NO_COLOR:
+                    if color_counts[color_idx] == 0:
+                        first_pos[color_idx] = i
+                    color_counts[color_idx] += 1
+                    i += 2
+                    continue
+            color_idx = single_table[buf[i]]
+            if color_idx != NO_COLOR:
+                if color_counts[color_idx] == 0:
+                    first_pos[color_idx] = i
+                color_counts[color_idx] += 1
+            i += 1
 
-def decode_paint_colors(triangle_paint: list[str | None]) -> list[int]:
+        best_idx = 0
+        best_count = 0
+        for color_idx in range(1, MAX_PAINT_INDEX_COUNT):
+            count = color_counts[color_idx]
+            if count > best_count or (
+                count == best_count and count > 0
+                and first_pos[color_idx] < first_pos[best_idx]
+            ):
+                best_idx = color_idx
+                best_count = count
+        return best_idx
+else:
+    SINGLE_CHAR_ARRAY = None
+    PAIR_ARRAY = None
+    _scan_long_code_jit = None
+
+
+def _factorize_paint_codes(
+    triangle_paint: dict[int, str] | None,
+    triangle_count: int
+) -> tuple[list[str | None], np.ndarray]:
     """
-    Decode a list of triangle paint_color values to palette indices.
+    Map each triangle to the position of its raw paint_color value among
+    the unique values.
     
-    Args:
-        triangle_paint: List of paint_color attribute values, one per triangle
-        
-    Returns:
-        List of palette indices (0-based integers)
+    Returns the unique codes (in first-seen order, with None first when
+    some triangles are unpainted) and an int array of per-triangle code
+    positions. Positions are packed into an array.array('i') while
+    scanning, so no Python int list is built.
     """
-    return [decode_paint_code(code) for code in triangle_paint]
+    if not triangle_paint:
+        return [None], np.zeros(triangle_count, dtype=np.intc)
+    
+    code_ids: dict[str | None, int] = {}
+    if len(triangle_paint) < triangle_count:
+        code_ids[None] = 0
+    painted_code_ids = np.frombuffer(array.array('i', (
+        code_ids.setdefault(code, len(code_ids)) for code in triangle_paint.values()
+    )), dtype=np.intc)
+    
+    if len(triangle_paint) == triangle_count:
+        # Every triangle painted: keys are 0..T-1 in order, no scatter needed
+        return list(code_ids), painted_code_ids
+    
+    tri_code_ids = np.zeros(triangle_count, dtype=np.intc)
+    painted = np.fromiter(triangle_paint.keys(), dtype=np.intp, count=len(triangle_paint))
+    tri_code_ids[painted] = painted_code_ids
+    return list(code_ids), tri_code_ids
+
 
+# Sentinel for "paint codes differ" (None is itself a valid code)
+_NO_SINGLE_CODE = object()
 
-def aggregate_vertex_colors(
+
+def compute_vertex_colors(
     vertex_count: int,
-    triangles: list[tuple[int, int, int]],
-    paint_indices: list[int],
-    palette: list[tuple[float, float, float, float]],
+    triangles: np.ndarray,
+    triangle_paint: dict[int, str] | None,
+    palette: np.ndarray,
     use_majority: bool = True
-) -> list[tuple[float, float, float, float]]:
+) -> np.ndarray:
     """
-    Aggregate per-triangle paint to per-vertex colors.
+    Decode per-triangle paint_color values straight to per-vertex colors.
     
     Since triangles share vertices but each triangle has its own paint color,
-    we need a strategy to assign a single color to each vertex.
+    a single color per vertex is chosen by vote. Each unique code is decoded
+    once and its triangles receive their compact vote slot directly, so no
+    per-triangle palette index array is built. Vertices that no triangle
+    references always get the first palette color.
     
     Args:
         vertex_count: Number of vertices in the mesh
-        triangles: List of (v1, v2, v3) vertex index tuples
-        paint_indices: List of palette indices, one per triangle
-        palette: List of RGBA color tuples
+        triangles: (M, 3) int32 array of vertex indices
+        triangle_paint: Sparse map of triangle index -> paint_color value
+            (unpainted triangles omitted), or None if nothing is painted
+        palette: (K, 4) float32 array of RGBA colors
         use_majority: If True, use majority vote; if False, use lowest index
         
     Returns:
-        List of RGBA color tuples, one per vertex
+        (V, 4) float32 array of RGBA colors, one row per vertex, ready for
+        a flat foreach_set upload
     """
-    # Build per-vertex list of incident triangle paint indices
-    vertex_paint_indices: list[list[int]] = [[] for _ in range(vertex_count)]
-    
-    for tri_idx, (v1, v2, v3) in enumerate(triangles):
-        paint_idx = paint_indices[tri_idx]
-        vertex_paint_indices[v1].append(paint_idx)
-        vertex_paint_indices[v2].append(paint_idx)
-        vertex_paint_indices[v3].append(paint_idx)
-    
-    # Resolve each vertex's color
-    vertex_colors: list[tuple[float, float, float, float]] = []
-    default_color = palette[0] if palette else (1.0, 1.0, 1.0, 1.0)
-    
-    for vert_idx, incident_paints in enumerate(vertex_paint_indices):
-        if not incident_paints:
-            # Isolated vertex (shouldn't happen in valid mesh)
-            vertex_colors.append(default_color)
-            continue
-        
+    triangle_count = len(triangles)
+
+    # Fast path: one paint code across the whole mesh (common for single-color
+    # objects, and every unpainted one) needs no grouping; list.count
+    # compares at C speed
+    single_code = _NO_SINGLE_CODE
+    if not triangle_paint:
+        single_code = None
+    elif len(triangle_paint) == triangle_count:
+        paint_values = list(triangle_paint.values())
+        if paint_values.count(paint_values[0]) == triangle_count:
+            single_code = paint_values[0]
+    if single_code is not _NO_SINGLE_CODE:
+        used_paints = np.array([decode_paint_code(single_code)], dtype=np.intp)
+        return _vote_vertex_colors(
+            vertex_count, triangles, np.zeros(triangle_count, dtype=np.intp),
+            used_paints, palette, use_majority
+        )
+
+    codes, tri_code_ids = _factorize_paint_codes(triangle_paint, triangle_count)
+    code_paints = [decode_paint_code(code) for code in codes]
+
+    # Slots keep paint index order, so "lowest slot" means "lowest index"
+    used_paints = np.array(sorted(set(code_paints)), dtype=np.intp)
+    code_slots = np.searchsorted(used_paints, code_paints)
+    tri_slots = code_slots[tri_code_ids]
+
+    return _vote_vertex_colors(
+        vertex_count, triangles, tri_slots, used_paints, palette, use_majority
+    )
+
+
+def _vote_vertex_colors(
+    vertex_count: int,
+    triangles: np.ndarray,
+    tri_slots: np.ndarray,
+    used_paints: np.ndarray,
+    palette: np.ndarray,
+    use_majority: bool
+) -> np.ndarray:
+    """
+    Resolve per-vertex colors from per-triangle vote slots.
+    
+    triangles is the (M, 3) int32 vertex index array; tri_slots holds, per
+    triangle, an index into used_paints (the sorted palette indices present
+    in the mesh).
+    """
+    # Stage the palette plus the default color as an extra trailing row,
+    # used for isolated vertices
+    palette = np.asarray(palette, dtype=np.float32).reshape(-1, 4)
+    palette_size = len(palette)
+    default_color = palette[:1] if palette_size else np.ones((1, 4), dtype=np.float32)
+    colors = np.concatenate((palette, default_color))
+
+    if vertex_count == 0 or len(tri_slots) == 0:
+        return np.repeat(default_color, vertex_count, axis=0)
+
+    flat_v = np.asarray(triangles, dtype=np.intp).reshape(-1)
+
+    # Every triangle has the same paint: broadcast its color without voting,
+    # then reset isolated vertices to the default like the voting paths do
+    if len(used_paints) == 1:
+        paint_idx = int(used_paints[0])
+        if palette_size:
+            paint_idx %= palette_size
+        result = np.repeat(colors[paint_idx:paint_idx + 1], vertex_count, axis=0)
+        referenced = np.zeros(vertex_count, dtype=bool)
+        referenced[flat_v] = True
+        result[~referenced] = default_color
+        return result
+
+    # Replicate each triangle's slot to its corners
+    num_slots = len(used_paints)
+    flat_slots = np.repeat(tri_slots, 3)
+
+    if num_slots == 2:
+        # Two paints (base plus one accent is common): only the upper slot's
+        # votes need counting, compared against each vertex's total
+        totals = np.bincount(flat_v, minlength=vertex_count)
+        upper_votes = np.bincount(flat_v[flat_slots == 1], minlength=vertex_count)
         if use_majority:
-            # Majority vote with lowest-index tie-breaker
-            counter = Counter(incident_paints)
-            max_count = max(counter.values())
-            # Among tied counts, pick lowest paint index
-            candidates = [idx for idx, cnt in counter.items() if cnt == max_count]
-            chosen_idx = min(candidates)
+            # Strict majority; ties go to the lower paint index
+            chosen_slots = (upper_votes * 2 > totals).view(np.uint8)
         else:
-            # Simple: lowest paint index wins
-            chosen_idx = min(incident_paints)
-        
-        # Map to palette color (with bounds check)
-        if 0 <= chosen_idx < len(palette):
-            vertex_colors.append(palette[chosen_idx])
+            # Lowest index: upper only when no triangle voted for the lower
+            chosen_slots = (upper_votes == totals).view(np.uint8)
+        isolated = totals == 0
+    else:
+        # Tally per-vertex votes as a (V, U) histogram in a single bincount
+        counts = np.bincount(
+            flat_v * num_slots + flat_slots, minlength=vertex_count * num_slots
+        ).reshape(vertex_count, num_slots)
+
+        if use_majority:
+            # Majority vote; argmax returns the lowest paint index on ties
+            chosen_slots = counts.argmax(axis=1)
         else:
-            # Wrap around if palette is smaller than index
-            vertex_colors.append(palette[chosen_idx % len(palette)])
-    
-    return vertex_colors
+            # Simple: lowest paint index wins
+            chosen_slots = (counts > 0).argmax(axis=1)
+        isolated = ~counts.any(axis=1)
+
+    # Map to palette rows, wrapping around if palette is smaller than index
+    chosen = used_paints[chosen_slots]
+    if palette_size:
+        chosen %= palette_size
+
+    # Isolated vertices (shouldn't happen in valid mesh) keep the default color
+    chosen[isolated] = palette_size
+
+    return colors[chosen]
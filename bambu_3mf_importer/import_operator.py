@@ -5,14 +5,17 @@ Blender import operator for 3MF files with color/paint data.
 Supports Bambu Studio, OrcaSlicer, Snapmaker Orca, and compatible slicers.
 """
 
+import functools
+
 import bpy
 from bpy.props import StringProperty, EnumProperty, BoolProperty
 from bpy_extras.io_utils import ImportHelper
 from mathutils import Matrix
+import numpy as np
 
 from .three_mf_zip import ThreeMFArchive
 from .three_mf_model import parse_model_file, BuildItem, MeshObject, ObjectEntry
-from .bambu_paint import decode_paint_colors, aggregate_vertex_colors, PALETTE_GENERATED
+from .bambu_paint import compute_vertex_colors, PALETTE_GENERATED
 
 
 class IMPORT_OT_bambu_3mf(bpy.types.Operator, ImportHelper):
@@ -83,12 +86,16 @@ class IMPORT_OT_bambu_3mf(bpy.types.Operator, ImportHelper):
             self.report({'ERROR'}, "No model files found in 3MF archive")
             return {'CANCELLED'}
 
+        # Files are parsed one at a time: the iterparse loop runs Python code
+        # for every element, so parsing is GIL-bound and a thread pool would
+        # only add contention and per-file buffers held in parallel
         for model_path in model_files:
             try:
-                xml_content = archive.read_file(model_path)
-                objects, build_items, file_unit_scale = parse_model_file(
-                    xml_content, model_path
-                )
+                # Stream the file so it is never held decompressed in full
+                with archive.open_file(model_path) as stream:
+                    objects, build_items, file_unit_scale = parse_model_file(
+                        stream, model_path
+                    )
                 # Use unit scale from first file that specifies it
                 if file_unit_scale is not None:
                     unit_scale = file_unit_scale
@@ -114,12 +121,18 @@ class IMPORT_OT_bambu_3mf(bpy.types.Operator, ImportHelper):
             self.report({'ERROR'}, "No objects found in 3MF file")
             return {'CANCELLED'}
 
+        # Index objects by id alone for the fallback lookup (first seen wins)
+        objects_by_id: dict[int, ObjectEntry] = {}
+        for (_, obj_id), obj_entry in all_objects.items():
+            objects_by_id.setdefault(obj_id, obj_entry)
+
         # Try to get filament palette from project metadata
         palette = PALETTE_GENERATED
         if self.palette_source == 'AUTO':
             detected_palette = archive.try_get_filament_palette()
-            if detected_palette:
+            if detected_palette is not None:
                 palette = detected_palette
+        palette = np.asarray(palette, dtype=np.float32)
 
         # Create Blender meshes and objects
         created_objects = []
@@ -129,7 +142,8 @@ class IMPORT_OT_bambu_3mf(bpy.types.Operator, ImportHelper):
         if not all_build_items:
             for (file_path, obj_id), obj_entry in all_objects.items():
                 meshes = self._resolve_meshes(
-                    all_objects, file_path, obj_id, Matrix.Identity(4)
+                    all_objects, objects_by_id, file_path, obj_id,
+                    Matrix.Identity(4)
                 )
                 for mesh_obj, combined_transform in meshes:
                     bl_mesh = self._create_blender_mesh(
@@ -149,7 +163,8 @@ class IMPORT_OT_bambu_3mf(bpy.types.Operator, ImportHelper):
                 
                 # Resolve all meshes for this build item (following component refs)
                 meshes = self._resolve_meshes(
-                    all_objects, item.source_file, item.object_id, build_transform
+                    all_objects, objects_by_id, item.source_file,
+                    item.object_id, build_transform
                 )
                 
                 if not meshes:
@@ -177,9 +192,7 @@ class IMPORT_OT_bambu_3mf(bpy.types.Operator, ImportHelper):
                     if self.import_transforms:
                         # Apply unit scale to translation part of transform
                         scaled_transform = combined_transform.copy()
-                        scaled_transform[0][3] *= unit_scale
-                        scaled_transform[1][3] *= unit_scale
-                        scaled_transform[2][3] *= unit_scale
+                        scaled_transform.translation *= unit_scale
                         bl_obj.matrix_world = scaled_transform
 
                     context.collection.objects.link(bl_obj)
@@ -195,7 +208,9 @@ class IMPORT_OT_bambu_3mf(bpy.types.Operator, ImportHelper):
         self.report({'INFO'}, f"Imported {len(created_objects)} object(s) from 3MF")
         return {'FINISHED'}
 
-    def _normalize_path(self, path: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _normalize_path(path: str) -> str:
         """Normalize a file path for consistent lookup."""
         # Remove leading slashes and normalize separators
         path = path.replace('\\', '/').lstrip('/')
@@ -204,6 +219,7 @@ class IMPORT_OT_bambu_3mf(bpy.types.Operator, ImportHelper):
     def _resolve_meshes(
         self,
         all_objects: dict[tuple[str, int], ObjectEntry],
+        objects_by_id: dict[int, ObjectEntry],
         source_file: str,
         object_id: int,
         parent_transform: Matrix,
@@ -223,10 +239,7 @@ class IMPORT_OT_bambu_3mf(bpy.types.Operator, ImportHelper):
         
         if obj_entry is None:
             # Try to find by object_id alone (for simple files)
-            for (fp, oid), entry in all_objects.items():
-                if oid == object_id:
-                    obj_entry = entry
-                    break
+            obj_entry = objects_by_id.get(object_id)
         
         if obj_entry is None:
             return []
@@ -255,7 +268,8 @@ class IMPORT_OT_bambu_3mf(bpy.types.Operator, ImportHelper):
 
             # Recursively resolve
             sub_meshes = self._resolve_meshes(
-                all_objects, comp_file, comp.object_id, combined, depth + 1
+                all_objects, objects_by_id, comp_file, comp.object_id,
+                combined, depth + 1
             )
             results.extend(sub_meshes)
 
@@ -265,32 +279,40 @@ class IMPORT_OT_bambu_3mf(bpy.types.Operator, ImportHelper):
         self,
         mesh_obj: MeshObject,
         unit_scale: float,
-        palette: list[tuple[float, float, float, float]],
+        palette: np.ndarray,
         name: str
     ) -> bpy.types.Mesh:
         """Create a Blender mesh from parsed 3MF mesh object."""
         # Scale vertices
-        scaled_verts = [
-            (v[0] * unit_scale, v[1] * unit_scale, v[2] * unit_scale)
-            for v in mesh_obj.vertices
-        ]
+        # (a new array: the parsed mesh may be shared by several objects)
+        verts = mesh_obj.vertices * np.float32(unit_scale)
+        tris = mesh_obj.triangles
+        num_tris = len(tris)
 
-        # Create mesh
+        # Create mesh, filling Blender's buffers directly instead of from_pydata
         bl_mesh = bpy.data.meshes.new(name)
-        bl_mesh.from_pydata(scaled_verts, [], mesh_obj.triangles)
-        bl_mesh.update()
-
-        # Add vertex colors if we have paint data
-        if mesh_obj.triangle_paint:
-            # Decode paint codes to palette indices
-            paint_indices = decode_paint_colors(mesh_obj.triangle_paint)
-
-            # Aggregate to per-vertex colors
+        bl_mesh.vertices.add(len(verts))
+        bl_mesh.loops.add(num_tris * 3)
+        bl_mesh.polygons.add(num_tris)
+        bl_mesh.vertices.foreach_set("co", verts.ravel())
+        bl_mesh.loops.foreach_set("vertex_index", tris.ravel())
+        bl_mesh.polygons.foreach_set(
+            "loop_start", np.arange(0, num_tris * 3, 3, dtype=np.int32)
+        )
+        if hasattr(bl_mesh, "shade_flat"):
+            # Blender 4.1+ defaults new faces to smooth; from_pydata shaded flat
+            bl_mesh.shade_flat()
+        bl_mesh.update(calc_edges=True)
+
+        # Add vertex colors (unpainted meshes, triangle_paint None, get the
+        # first palette color everywhere, same as unpainted triangles)
+        if num_tris:
+            # Decode paint codes and aggregate to per-vertex colors
             use_majority = (self.conflict_resolution == 'MAJORITY')
-            vertex_colors = aggregate_vertex_colors(
-                len(mesh_obj.vertices),
-                mesh_obj.triangles,
-                paint_indices,
+            vertex_colors = compute_vertex_colors(
+                len(verts),
+                tris,
+                mesh_obj.triangle_paint,
                 palette,
                 use_majority=use_majority
             )
@@ -302,9 +324,8 @@ class IMPORT_OT_bambu_3mf(bpy.types.Operator, ImportHelper):
                 domain='POINT'
             )
 
-            # Fill color data
-            for i, color in enumerate(vertex_colors):
-                color_attr.data[i].color = color
+            # Fill color data in one bulk call (flat RGBA floats)
+            color_attr.data.foreach_set("color", vertex_colors.ravel())
 
         return bl_mesh
 
@@ -5,20 +5,43 @@
 Supports Bambu Studio, OrcaSlicer, Snapmaker Orca, and compatible slicers.
 """
 
-import xml.etree.ElementTree as ET
+from __future__ import annotations
+
 from dataclasses import dataclass, field
+import functools
+from io import BytesIO
+from typing import IO
 from mathutils import Matrix
+import numpy as np
 import re
 
+try:
+    import numba
+except ImportError:  # Optional: JIT-compiles the mesh number parsers
+    numba = None
+
+try:
+    # Optional: lxml parses large model files considerably faster
+    from lxml import etree as ET
+    HAS_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    HAS_LXML = False
+
 
 @dataclass
 class MeshObject:
-    """Represents a 3MF mesh object with actual geometry."""
+    """
+    Represents a 3MF mesh object with actual geometry.
+    
+    Geometry is stored as contiguous NumPy arrays in the dtypes Blender's
+    foreach_set expects, so they can be uploaded without conversion.
+    """
     id: int
     name: str | None
-    vertices: list[tuple[float, float, float]]
-    triangles: list[tuple[int, int, int]]
-    triangle_paint: list[str | None]  # Per-triangle paint_color attribute values
+    vertices: np.ndarray  # (N, 3) float32 vertex positions
+    triangles: np.ndarray  # (M, 3) int32 vertex indices
+    triangle_paint: dict[int, str] | None  # Triangle index -> paint_color, painted triangles only (None if none)
 
 
 @dataclass
@@ -48,40 +71,51 @@ class BuildItem:
 
 # 3MF namespace URIs (we match by local name to be namespace-agnostic)
 NS_CORE = "http://schemas.microsoft.com/3dmanufacturing/core/2015/02"
-
-
+NS_PRODUCTION = "http://schemas.microsoft.com/3dmanufacturing/production/2015/06"
+
+# Fully qualified keys for namespaced attributes we look up, so the
+# common case is a direct lookup rather than a scan of every attribute
+QUALIFIED_ATTRS = {
+    'path': '{%s}path' % NS_PRODUCTION,
+}
+
+# 3MF unit names mapped to meters
+UNIT_SCALES = {
+    'micron': 0.000001,
+    'millimeter': 0.001,
+    'centimeter': 0.01,
+    'inch': 0.0254,
+    'foot': 0.3048,
+    'meter': 1.0,
+}
+
+
+@functools.lru_cache(maxsize=64)
 def local_name(tag: str) -> str:
     """Extract local name from a potentially namespaced tag."""
+    if not isinstance(tag, str):
+        return ''  # lxml comments/processing instructions have callable tags
     if tag.startswith('{'):
         return tag.split('}', 1)[1]
     return tag
 
 
-def find_elements_by_local_name(parent: ET.Element, local: str) -> list[ET.Element]:
-    """Find all child elements matching a local name (ignoring namespace)."""
-    results = []
-    for child in parent:
-        if local_name(child.tag) == local:
-            results.append(child)
-    return results
-
-
-def find_element_by_local_name(parent: ET.Element, local: str) -> ET.Element | None:
-    """Find first child element matching a local name (ignoring namespace)."""
-    for child in parent:
-        if local_name(child.tag) == local:
-            return child
-    return None
-
-
 def get_attr(elem: ET.Element, attr_name: str, default: str | None = None) -> str | None:
     """
     Get attribute value, trying both with and without namespace prefix.
     Also handles Bambu's custom attributes like 'paint_color'.
     """
     # Try direct attribute name
-    if attr_name in elem.attrib:
-        return elem.attrib[attr_name]
+    value = elem.get(attr_name)
+    if value is not None:
+        return value
+    
+    # Try the known fully qualified name
+    qualified = QUALIFIED_ATTRS.get(attr_name)
+    if qualified is not None:
+        value = elem.get(qualified)
+        if value is not None:
+            return value
     
     # Try with common namespace prefixes stripped
     for key, value in elem.attrib.items():
@@ -95,6 +129,35 @@ def get_attr(elem: ET.Element, attr_name: str, default: str | None = None) -> st
     return default
 
 
+# Local names of the elements parse_model_file uses. lxml can filter
+# iterparse events on these in C (matching any namespace), so metadata,
+# comments and extension content never reach the Python loop
+STREAMED_TAGS = (
+    'model', 'resources', 'object', 'mesh', 'vertices', 'vertex',
+    'triangles', 'triangle', 'components', 'component', 'build', 'item',
+)
+
+
+def _iterparse(source: IO[bytes], events: tuple[str, ...]):
+    """Create an iterparse iterator for whichever XML backend is in use."""
+    if HAS_LXML:
+        # Lift libxml2's default size limits so very large meshes still parse
+        return ET.iterparse(
+            source, events=events, huge_tree=True,
+            tag=['{*}' + tag for tag in STREAMED_TAGS],
+        )
+    return ET.iterparse(source, events=events)
+
+
+# Common spellings of the identity transform, and its values
+IDENTITY_TRANSFORMS = frozenset((
+    '1 0 0 0 1 0 0 0 1 0 0 0',
+    '1.0 0.0 0.0 0.0 1.0 0.0 0.0 0.0 1.0 0.0 0.0 0.0',
+))
+IDENTITY_TRANSFORM_VALUES = np.array([1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0], dtype=np.float64)
+
+
+@functools.lru_cache(maxsize=1024)
 def parse_transform(transform_str: str) -> Matrix | None:
     """
     Parse a 3MF transform string into a Blender Matrix.
@@ -107,27 +170,33 @@ def parse_transform(transform_str: str) -> Matrix | None:
     | m10 m11 m12 0 |
     | m20 m21 m22 0 |
     | m30 m31 m32 1 |
+    
+    Identity transforms return None, which callers already treat as "no
+    transform", so they never cost a Matrix or a matrix multiply.
+    
+    Results are cached by string since instanced components usually repeat
+    the same few transforms; the returned Matrix is frozen, so copy it
+    before modifying.
     """
-    if not transform_str:
+    if not transform_str or transform_str.strip() in IDENTITY_TRANSFORMS:
         return None
     
     try:
-        values = [float(v) for v in transform_str.strip().split()]
-        if len(values) != 12:
-            return None
-        
-        # 3MF matrix layout to Blender 4x4 matrix
-        # 3MF: row-major m00 m01 m02 m10 m11 m12 m20 m21 m22 m30 m31 m32
-        m = values
-        matrix = Matrix((
-            (m[0], m[3], m[6], m[9]),
-            (m[1], m[4], m[7], m[10]),
-            (m[2], m[5], m[8], m[11]),
-            (0.0,  0.0,  0.0,  1.0)
-        ))
-        return matrix
-    except (ValueError, IndexError):
+        values = np.fromstring(transform_str, dtype=np.float64, sep=' ')
+    except ValueError:
+        return None  # Malformed; ignore the transform, not the whole file
+    if values.size != 12:
         return None
+    if np.array_equal(values, IDENTITY_TRANSFORM_VALUES):
+        return None  # Identity spelled some other way
+    
+    # 3MF matrix layout to Blender 4x4 matrix
+    # 3MF: row-major m00 m01 m02 m10 m11 m12 m20 m21 m22 m30 m31 m32,
+    # i.e. the transpose of Blender's column-vector convention. The
+    # transposed view converts straight to the top three rows.
+    rows = values.reshape(4, 3).T.tolist()
+    rows.append((0.0, 0.0, 0.0, 1.0))
+    return Matrix(rows).freeze()
 
 
 def parse_unit_scale(unit_str: str | None) -> float | None:
@@ -140,61 +209,119 @@ def parse_unit_scale(unit_str: str | None) -> float | None:
     if not unit_str:
         return None  # Let caller use default
     
-    unit_lower = unit_str.lower()
-    scales = {
-        'micron': 0.000001,
-        'millimeter': 0.001,
-        'centimeter': 0.01,
-        'inch': 0.0254,
-        'foot': 0.3048,
-        'meter': 1.0,
-    }
-    return scales.get(unit_lower)
+    return UNIT_SCALES.get(unit_str.lower())
+
+
+@dataclass
+class _PendingObject:
+    """Accumulates an <object> element's contents while it is streamed."""
+    id: int
+    name: str | None
+    # Raw attribute strings, flattened (x y z ... / v1 v2 v3 ...), converted
+    # to arrays in one pass when the object closes
+    vertex_coords: list[str] = field(default_factory=list)
+    triangle_indices: list[str] = field(default_factory=list)
+    triangle_paint: dict[int, str] = field(default_factory=dict)
+    components: list[ComponentRef] = field(default_factory=list)
 
 
 def parse_model_file(
-    xml_content: bytes,
+    xml_content: bytes | IO[bytes],
     source_path: str
 ) -> tuple[dict[int, ObjectEntry], list[BuildItem], float | None]:
     """
     Parse a 3MF .model XML file.
     
+    The file is streamed with iterparse: vertices, triangles, components
+    and build items are consumed as their end tags arrive and cleared
+    straight away, so the full document tree is never held in memory.
+    xml_content may be the raw bytes or a binary file-like object (such
+    as an open archive member), which is read incrementally.
+    
     Returns:
         - Dictionary of object_id -> ObjectEntry (may contain mesh or component refs)
         - List of BuildItems
         - Unit scale factor (or None if not specified)
     """
-    root = ET.fromstring(xml_content)
-    
-    # Get unit scale from model element
-    unit_str = get_attr(root, 'unit')
-    unit_scale = parse_unit_scale(unit_str)
-    
+    unit_scale: float | None = None
     objects: dict[int, ObjectEntry] = {}
     build_items: list[BuildItem] = []
     
-    # Find resources element
-    resources_elem = find_element_by_local_name(root, 'resources')
-    if resources_elem is not None:
-        # Parse all object elements
-        for obj_elem in find_elements_by_local_name(resources_elem, 'object'):
-            obj_entry = _parse_object(obj_elem)
-            if obj_entry is not None:
-                objects[obj_entry.id] = obj_entry
-    
-    # Find build element
-    build_elem = find_element_by_local_name(root, 'build')
-    if build_elem is not None:
-        for item_elem in find_elements_by_local_name(build_elem, 'item'):
-            build_item = _parse_build_item(item_elem)
+    # Local names of the currently open elements, root first:
+    # model / resources / object / mesh / vertices / vertex
+    # model / resources / object / components / component
+    # model / build / item
+    path: list[str] = []
+    pending: _PendingObject | None = None
+    
+    source = BytesIO(xml_content) if isinstance(xml_content, bytes) else xml_content
+    for event, elem in _iterparse(source, ('start', 'end')):
+        if event == 'start':
+            path.append(local_name(elem.tag))
+            depth = len(path)
+            if depth == 1:
+                # Get unit scale from model element
+                unit_scale = parse_unit_scale(get_attr(elem, 'unit'))
+            elif depth == 3 and path[1] == 'resources' and path[2] == 'object':
+                pending = _start_object(elem)
+            continue
+        
+        name = path.pop()
+        depth = len(path) + 1
+        
+        if depth >= 4 and path[1] == 'resources':
+            # Contents of an object (skipped if the object has no usable id)
+            if pending is None:
+                pass
+            elif depth == 6 and path[3] == 'mesh':
+                # Core mesh attributes are unqualified; direct lookups first,
+                # with get_attr only as the fallback
+                if name == 'vertex' and path[4] == 'vertices':
+                    pending.vertex_coords.extend((
+                        elem.get('x') or get_attr(elem, 'x', '0'),
+                        elem.get('y') or get_attr(elem, 'y', '0'),
+                        elem.get('z') or get_attr(elem, 'z', '0'),
+                    ))
+                elif name == 'triangle' and path[4] == 'triangles':
+                    pending.triangle_indices.extend((
+                        elem.get('v1') or get_attr(elem, 'v1', '0'),
+                        elem.get('v2') or get_attr(elem, 'v2', '0'),
+                        elem.get('v3') or get_attr(elem, 'v3', '0'),
+                    ))
+                    # Get Bambu paint_color attribute (may not exist); only
+                    # scan for a prefixed variant if there are extra attributes
+                    paint_color = elem.get('paint_color')
+                    if paint_color is None and len(elem.attrib) > 3:
+                        paint_color = get_attr(elem, 'paint_color')
+                    # Stored sparsely: unpainted meshes cost nothing here
+                    if paint_color is not None:
+                        tri_index = len(pending.triangle_indices) // 3 - 1
+                        pending.triangle_paint[tri_index] = paint_color
+            elif depth == 5 and name == 'component' and path[3] == 'components':
+                comp_ref = _parse_component(elem)
+                if comp_ref is not None:
+                    pending.components.append(comp_ref)
+        elif depth == 3 and path[1] == 'resources' and name == 'object':
+            if pending is not None:
+                obj_entry = _finish_object(pending)
+                if obj_entry is not None:
+                    objects[obj_entry.id] = obj_entry
+            pending = None
+        elif depth == 3 and path[1] == 'build' and name == 'item':
+            build_item = _parse_build_item(elem)
             if build_item is not None:
                 build_items.append(build_item)
+        elif depth <= 2:
+            continue  # Keep the root and its direct children intact
+        
+        # Free consumed content as we go
+        elem.clear()
     
     return objects, build_items, unit_scale
 
 
-def _parse_object(obj_elem: ET.Element) -> ObjectEntry | None:
-    """Parse an object element - may contain a mesh or component references."""
+def _start_object(obj_elem: ET.Element) -> _PendingObject | None:
+    """Begin an object element; returns None if it has no valid id."""
     obj_id_str = get_attr(obj_elem, 'id')
     if obj_id_str is None:
         return None
@@ -204,81 +331,140 @@ def _parse_object(obj_elem: ET.Element) -> ObjectEntry | None:
     except ValueError:
         return None
     
-    obj_name = get_attr(obj_elem, 'name')
-    
+    return _PendingObject(id=obj_id, name=get_attr(obj_elem, 'name'))
+
+
+def _finish_object(pending: _PendingObject) -> ObjectEntry | None:
+    """Build an ObjectEntry from a fully streamed object element."""
     mesh_obj: MeshObject | None = None
-    components: list[ComponentRef] = []
-    
-    # Try to parse mesh element
-    mesh_elem = find_element_by_local_name(obj_elem, 'mesh')
-    if mesh_elem is not None:
-        mesh_obj = _parse_mesh(obj_id, obj_name, mesh_elem)
-    
-    # Try to parse components element (3MF Production Extension)
-    components_elem = find_element_by_local_name(obj_elem, 'components')
-    if components_elem is not None:
-        for comp_elem in find_elements_by_local_name(components_elem, 'component'):
-            comp_ref = _parse_component(comp_elem)
-            if comp_ref is not None:
-                components.append(comp_ref)
+    if pending.vertex_coords and pending.triangle_indices:
+        vertices = _parse_number_strings(pending.vertex_coords, np.float32)
+        triangles = _parse_number_strings(pending.triangle_indices, np.int32)
+        
+        # Indices go straight into foreach_set and bincount later, neither of
+        # which bounds-checks them, so reject bad ones here in one pass
+        if triangles.min() < 0 or triangles.max() >= len(vertices):
+            raise ValueError(f"Triangle vertex index out of range in object {pending.id}")
+        
+        mesh_obj = MeshObject(
+            id=pending.id,
+            name=pending.name,
+            vertices=vertices,
+            triangles=triangles,
+            triangle_paint=pending.triangle_paint or None
+        )
     
     # Return None only if there's neither mesh nor components
-    if mesh_obj is None and not components:
+    if mesh_obj is None and not pending.components:
         return None
     
     return ObjectEntry(
-        id=obj_id,
-        name=obj_name,
+        id=pending.id,
+        name=pending.name,
         mesh=mesh_obj,
-        components=components
+        components=pending.components
     )
 
 
-def _parse_mesh(obj_id: int, obj_name: str | None, mesh_elem: ET.Element) -> MeshObject | None:
-    """Parse a mesh element containing vertices and triangles."""
-    # Parse vertices
-    vertices_elem = find_element_by_local_name(mesh_elem, 'vertices')
-    if vertices_elem is None:
-        return None
-    
-    vertices: list[tuple[float, float, float]] = []
-    for vertex_elem in find_elements_by_local_name(vertices_elem, 'vertex'):
-        x = float(get_attr(vertex_elem, 'x', '0'))
-        y = float(get_attr(vertex_elem, 'y', '0'))
-        z = float(get_attr(vertex_elem, 'z', '0'))
-        vertices.append((x, y, z))
-    
-    if not vertices:
-        return None
-    
-    # Parse triangles
-    triangles_elem = find_element_by_local_name(mesh_elem, 'triangles')
-    if triangles_elem is None:
-        return None
-    
-    triangles: list[tuple[int, int, int]] = []
-    triangle_paint: list[str | None] = []
+def _parse_number_strings(values: list[str], dtype: type) -> np.ndarray:
+    """
+    Convert flattened numeric attribute strings to an (N, 3) array.
     
-    for tri_elem in find_elements_by_local_name(triangles_elem, 'triangle'):
-        v1 = int(get_attr(tri_elem, 'v1', '0'))
-        v2 = int(get_attr(tri_elem, 'v2', '0'))
-        v3 = int(get_attr(tri_elem, 'v3', '0'))
-        triangles.append((v1, v2, v3))
+    All strings are joined and parsed in a single native loop instead of
+    one float()/int() call per value. Coordinates go through the Numba
+    kernel when available; everything else, including anything the kernel
+    rejects, goes through NumPy's text parser, which reports invalid input.
+    """
+    joined = ' '.join(values)
+    if numba is not None and dtype is np.float32 and joined.isascii():
+        result = np.empty(len(values), dtype=dtype)
+        buf = np.frombuffer(joined.encode('ascii'), dtype=np.uint8)
+        if _parse_floats_jit(buf, result, POWERS_OF_TEN) == len(values):
+            return result.reshape(-1, 3)
+    
+    result = np.fromstring(joined, dtype=dtype, sep=' ')
+    if result.size != len(values):
+        raise ValueError(f"Invalid numeric attribute in mesh data ({dtype.__name__})")
+    return result.reshape(-1, 3)
+
+
+if numba is not None:
+    # Exact float64 powers of ten for the fast float path
+    POWERS_OF_TEN = np.array([10.0 ** k for k in range(23)])
+
+    @numba.njit(cache=True, nogil=True)
+    def _skip_spaces(buf, i):
+        """Advance past ASCII whitespace."""
+        while i < buf.shape[0] and (buf[i] == 32 or 9 <= buf[i] <= 13):
+            i += 1
+        return i
+
+    @numba.njit(cache=True, nogil=True)
+    def _parse_floats_jit(buf, out, powers_of_ten):
+        """
+        Parse whitespace-separated 3MF numbers (ST_Number) from a uint8 array.
         
-        # Get Bambu paint_color attribute (may not exist)
-        paint_color = get_attr(tri_elem, 'paint_color')
-        triangle_paint.append(paint_color)
-    
-    if not triangles:
-        return None
-    
-    return MeshObject(
-        id=obj_id,
-        name=obj_name,
-        vertices=vertices,
-        triangles=triangles,
-        triangle_paint=triangle_paint
-    )
+        Only the exactly-rounded fast path is handled (mantissa below 2**53,
+        decimal exponent within +/-22); returns -1 for anything else so
+        the caller can fall back to NumPy.
+        """
+        length = buf.shape[0]
+        count = 0
+        i = _skip_spaces(buf, 0)
+        while i < length:
+            if count == out.shape[0]:
+                return -1
+            negative = buf[i] == 45  # '-'
+            if negative or buf[i] == 43:  # '+'
+                i += 1
+            mantissa = 0
+            exponent = 0
+            digits = 0
+            while i < length and 48 <= buf[i] <= 57:
+                mantissa = mantissa * 10 + (buf[i] - 48)
+                digits += 1
+                i += 1
+            if i < length and buf[i] == 46:  # '.'
+                i += 1
+                while i < length and 48 <= buf[i] <= 57:
+                    mantissa = mantissa * 10 + (buf[i] - 48)
+                    exponent -= 1
+                    digits += 1
+                    i += 1
+            if digits == 0 or digits > 15:
+                return -1
+            if i < length and (buf[i] == 101 or buf[i] == 69):  # 'e' / 'E'
+                i += 1
+                exp_negative = i < length and buf[i] == 45
+                if i < length and (buf[i] == 45 or buf[i] == 43):
+                    i += 1
+                exp_value = 0
+                exp_digits = 0
+                while i < length and 48 <= buf[i] <= 57:
+                    exp_value = exp_value * 10 + (buf[i] - 48)
+                    exp_digits += 1
+                    if exp_digits > 3:
+                        return -1
+                    i += 1
+                if exp_digits == 0:
+                    return -1
+                exponent += -exp_value if exp_negative else exp_value
+            if i < length and not (buf[i] == 32 or 9 <= buf[i] <= 13):
+                return -1
+            if exponent < -22 or exponent > 22:
+                return -1
+            value = float(mantissa)
+            if exponent < 0:
+                value /= powers_of_ten[-exponent]
+            else:
+                value *= powers_of_ten[exponent]
+            out[count] = -value if negative else value
+            count += 1
+            i = _skip_spaces(buf, i)
+        return count
+else:
+    POWERS_OF_TEN = None
+    _parse_floats_jit = None
 
 
 def _parse_component(comp_elem: ET.Element) -> ComponentRef | None:
@@ -8,7 +8,47 @@ Supports Bambu Studio, OrcaSlicer, Snapmaker Orca, and compatible slicers.
 import zipfile
 import json
 import re
+from collections import deque
+import numpy as np
 from pathlib import PurePosixPath
+from typing import IO, Iterator
+
+try:
+    # Optional: orjson parses large project configs faster, straight from bytes
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+
+# Either a run of hex colors following a filament_colour key, e.g.
+# "filament_colour": ["#RRGGBB", ...] or filament_colour = #RRGGBB;#RRGGBB,
+# or any JSON-style array of quoted hex colors. Longer hex tokens (e.g.
+# #RRGGBBAA) must fail the match rather than be cut to six digits.
+_FILAMENT_OR_ARRAY_RE = re.compile(
+    rb'filament[_\s]*colou?r["\'\s:=\[]+'
+    rb'(?P<filament>(?:["\']?#[0-9A-Fa-f]{6}(?![0-9A-Fa-f])["\']?[\s,;]*)+)'
+    rb'|\[(?P<array>(?:\s*"#[0-9A-Fa-f]{6}(?![0-9A-Fa-f])"\s*,?\s*)+)\]',
+    re.IGNORECASE,
+)
+_HEX_COLOR_RE = re.compile(rb'#([0-9A-Fa-f]{6})(?![0-9A-Fa-f])')
+_HEX_STR_RE = re.compile(r'#+([0-9A-Fa-f]{6})')
+
+# Common locations for Bambu Studio metadata, checked in this order;
+# project_settings.config contains the filament_colour array
+_KNOWN_METADATA_PATHS = (
+    'Metadata/project_settings.config',
+    'Metadata/model_settings.config',
+    'Metadata/slice_info.config',
+    '.config/filament_settings.config',
+)
+
+# Extensions of other metadata files that may hold filament colors
+_METADATA_EXTENSIONS = ('.config', '.json', '.xml')
+
+# Lowercased JSON keys that hold the per-filament color list
+_FILAMENT_COLOR_KEYS = frozenset((
+    'filament_colour', 'filament_color', 'filamentcolour', 'filamentcolor',
+))
 
 
 class ThreeMFArchive:
@@ -24,6 +64,12 @@ class ThreeMFArchive:
         self.filepath = filepath
         self.zipfile = zipfile.ZipFile(filepath, 'r')
         self._model_files: list[str] | None = None
+        # The central directory doesn't change, so list it once and index
+        # entries by their lowercased, forward-slashed name
+        self._namelist = self.zipfile.namelist()
+        self._lower_to_orig: dict[str, str] = {}
+        for name in self._namelist:
+            self._lower_to_orig.setdefault(name.lower().replace('\\', '/'), name)
 
     def __enter__(self):
         return self
@@ -38,12 +84,25 @@ class ThreeMFArchive:
 
     def namelist(self) -> list[str]:
         """Return list of all files in the archive."""
-        return self.zipfile.namelist()
+        return self._namelist
+
+    def _find_file(self, path: str) -> str | None:
+        """Return the archive name matching path case-insensitively, if any."""
+        return self._lower_to_orig.get(path.lower().replace('\\', '/'))
 
     def read_file(self, path: str) -> bytes:
         """Read a file from the archive."""
         return self.zipfile.read(path)
 
+    def open_file(self, path: str) -> IO[bytes]:
+        """
+        Open a file in the archive for streaming reads.
+        
+        Decompression happens as the stream is consumed, so large model
+        files never need to be held in memory in full.
+        """
+        return self.zipfile.open(path, 'r')
+
     def get_model_files(self) -> list[str]:
         """
         Discover all .model files in the archive.
@@ -56,23 +115,20 @@ class ThreeMFArchive:
         if self._model_files is not None:
             return self._model_files
 
-        all_files = self.namelist()
         model_files = []
         root_model = None
         object_models = []
         other_models = []
 
-        for path in all_files:
-            if not path.lower().endswith('.model'):
+        # Keys are already lowercased and normalized to forward slashes
+        for norm_path, path in self._lower_to_orig.items():
+            if not norm_path.endswith('.model'):
                 continue
 
-            # Normalize path for comparison
-            norm_path = path.replace('\\', '/')
-            
             # Check if this is the root model
-            if norm_path.lower() == '3d/3dmodel.model':
+            if norm_path == '3d/3dmodel.model':
                 root_model = path
-            elif '/3d/objects/' in norm_path.lower() or norm_path.lower().startswith('3d/objects/'):
+            elif '/3d/objects/' in norm_path or norm_path.startswith('3d/objects/'):
                 object_models.append(path)
             else:
                 other_models.append(path)
@@ -86,150 +142,124 @@ class ThreeMFArchive:
         self._model_files = model_files
         return model_files
 
-    def try_get_filament_palette(self) -> list[tuple[float, float, float, float]] | None:
+    def try_get_filament_palette(self) -> np.ndarray | None:
         """
         Attempt to extract filament colors from Bambu Studio project metadata.
         
         Bambu Studio stores project settings in various JSON/config files within
         the 3MF archive. This method tries to find filament color definitions.
         
-        Returns a list of RGBA tuples (0-1 range) if found, None otherwise.
+        Returns an (N, 4) float32 array of RGBA colors (0-1 range) if found,
+        None otherwise.
         """
-        # Common locations for Bambu Studio metadata
-        # project_settings.config contains filament_colour array - check it first
-        metadata_paths = [
-            'Metadata/project_settings.config',
-            'Metadata/model_settings.config', 
-            'Metadata/slice_info.config',
-            '.config/filament_settings.config',
-        ]
-
-        # Also check for any JSON-like files in Metadata/
-        all_files = self.namelist()
-        for path in all_files:
-            if 'metadata' in path.lower() and (
-                path.endswith('.config') or 
-                path.endswith('.json') or
-                path.endswith('.xml')
-            ):
-                if path not in metadata_paths:
-                    metadata_paths.append(path)
-
-        for path in metadata_paths:
+        # Candidates are produced lazily, so the archive-wide discovery scan
+        # only runs if none of the well-known files has a palette
+        for path in self._iter_metadata_paths():
             try:
                 content = self.read_file(path)
                 palette = self._parse_filament_colors(content)
-                if palette:
+                if palette is not None:
                     return palette
             except (KeyError, zipfile.BadZipFile):
                 continue
 
         return None
 
-    def _parse_filament_colors(self, content: bytes) -> list[tuple[float, float, float, float]] | None:
+    def _iter_metadata_paths(self) -> Iterator[str]:
+        """
+        Yield archive names that may hold filament colors, without repeats.
+        
+        Well-known Bambu Studio files come first, then any other config,
+        JSON or XML file under a metadata folder.
+        """
+        # Ordered set of the well-known files present in this archive
+        known = dict.fromkeys(
+            found for found in map(self._find_file, _KNOWN_METADATA_PATHS)
+            if found is not None
+        )
+        yield from known
+
+        for norm_path, path in self._lower_to_orig.items():
+            if (
+                'metadata' in norm_path
+                and norm_path.endswith(_METADATA_EXTENSIONS)
+                and path not in known
+            ):
+                yield path
+
+    def _parse_filament_colors(self, content: bytes) -> np.ndarray | None:
         """
         Parse filament colors from config/JSON content.
         
         Looks for patterns like:
         - "filament_colour" : ["#RRGGBB", ...]
-        - filament_colour = #RRGGBB
+        - filament_colour = #RRGGBB;#RRGGBB
         - color="#RRGGBB"
+        
+        The raw bytes are scanned once with a combined regex; JSON parsing
+        is only attempted when that finds nothing.
         """
+        # The first filament_colour run is authoritative (as in the JSON
+        # walk below) and takes priority over any bare array of hex colors
+        first_array = None
+        for match in _FILAMENT_OR_ARRAY_RE.finditer(content):
+            if match.lastgroup == 'filament':
+                return self._hex_run_to_rgba(match.group('filament'))
+            if first_array is None:
+                first_array = match.group('array')
+        if first_array is not None:
+            return self._hex_run_to_rgba(first_array)
+
+        # Fall back to walking the parsed JSON for less regular layouts
         try:
-            text = content.decode('utf-8', errors='ignore')
-        except:
+            data = json_loads(content)
+        except ValueError:  # Includes orjson.JSONDecodeError
             return None
+        if isinstance(data, (dict, list)):
+            return self._extract_colors_from_dict(data)
 
-        colors = []
+        return None
 
-        # Try JSON parsing first
-        try:
-            data = json.loads(text)
-            colors = self._extract_colors_from_dict(data)
-            if colors:
-                return colors
-        except json.JSONDecodeError:
-            pass
-
-        # Try regex patterns for hex colors associated with filament
-        # Pattern: filament_colour = #RRGGBB or "filament_colour": "#RRGGBB"
-        hex_pattern = re.compile(r'filament[_\s]*colou?r["\s:=]+["\']?(#[0-9A-Fa-f]{6})["\']?', re.IGNORECASE)
-        matches = hex_pattern.findall(text)
-        if matches:
-            for hex_color in matches:
-                rgba = self._hex_to_rgba(hex_color)
-                if rgba:
-                    colors.append(rgba)
-            if colors:
-                return colors
-
-        # Try to find any array of hex colors
-        array_pattern = re.compile(r'\[((?:\s*"#[0-9A-Fa-f]{6}"\s*,?\s*)+)\]')
-        array_match = array_pattern.search(text)
-        if array_match:
-            hex_in_array = re.findall(r'#[0-9A-Fa-f]{6}', array_match.group(1))
-            for hex_color in hex_in_array:
-                rgba = self._hex_to_rgba(hex_color)
-                if rgba:
-                    colors.append(rgba)
-            if colors:
-                return colors
+    def _extract_colors_from_dict(self, data: dict | list) -> np.ndarray | None:
+        """Breadth-first search of dict/list for the first filament color array."""
+        queue = deque([data])
+        while queue:
+            node = queue.popleft()
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    if isinstance(key, str) and key.lower() in _FILAMENT_COLOR_KEYS:
+                        if isinstance(value, str):
+                            value = [part.strip() for part in value.split(';')]
+                        if isinstance(value, list):
+                            hex_digits = ''.join(
+                                match.group(1) for match in (
+                                    _HEX_STR_RE.fullmatch(item)
+                                    for item in value if isinstance(item, str)
+                                ) if match
+                            )
+                            # The first populated filament_colour is the
+                            # authoritative source, stop searching
+                            if hex_digits:
+                                return self._hex_digits_to_rgba(hex_digits)
+                    elif isinstance(value, (dict, list)):
+                        queue.append(value)
+            else:
+                queue.extend(item for item in node if isinstance(item, (dict, list)))
 
         return None
 
-    def _extract_colors_from_dict(self, data: dict | list, depth: int = 0) -> list[tuple[float, float, float, float]]:
-        """Recursively search dict/list for filament color arrays."""
-        if depth > 10:
-            return []
-
-        colors = []
-
-        if isinstance(data, dict):
-            for key, value in data.items():
-                key_lower = key.lower()
-                # Match keys like "filament_colour", "filament_color", "filamentcolour", etc.
-                is_filament_color = (
-                    key_lower == 'filament_colour' or
-                    key_lower == 'filament_color' or
-                    ('filament' in key_lower and ('color' in key_lower or 'colour' in key_lower))
-                )
-                if is_filament_color:
-                    if isinstance(value, list):
-                        for item in value:
-                            if isinstance(item, str) and item.startswith('#'):
-                                rgba = self._hex_to_rgba(item)
-                                if rgba:
-                                    colors.append(rgba)
-                        # If we found colors in filament_colour, return immediately
-                        # (don't continue searching, this is the authoritative source)
-                        if colors:
-                            return colors
-                    elif isinstance(value, str) and value.startswith('#'):
-                        rgba = self._hex_to_rgba(value)
-                        if rgba:
-                            colors.append(rgba)
-                elif isinstance(value, (dict, list)):
-                    found = self._extract_colors_from_dict(value, depth + 1)
-                    if found:
-                        return found  # Return first found palette
-        elif isinstance(data, list):
-            for item in data:
-                if isinstance(item, (dict, list)):
-                    found = self._extract_colors_from_dict(item, depth + 1)
-                    if found:
-                        return found
-
-        return colors
-
-    def _hex_to_rgba(self, hex_color: str) -> tuple[float, float, float, float] | None:
-        """Convert #RRGGBB to (r, g, b, a) tuple with values 0-1."""
-        hex_color = hex_color.lstrip('#')
-        if len(hex_color) != 6:
-            return None
-        try:
-            r = int(hex_color[0:2], 16) / 255.0
-            g = int(hex_color[2:4], 16) / 255.0
-            b = int(hex_color[4:6], 16) / 255.0
-            return (r, g, b, 1.0)
-        except ValueError:
-            return None
+    def _hex_run_to_rgba(self, run: bytes) -> np.ndarray:
+        """Convert every #RRGGBB in a matched run of colors to RGBA."""
+        return self._hex_digits_to_rgba(b''.join(_HEX_COLOR_RE.findall(run)).decode('ascii'))
+
+    def _hex_digits_to_rgba(self, hex_digits: str) -> np.ndarray:
+        """
+        Convert concatenated RRGGBB digits to an (N, 4) float32 RGBA array.
+        
+        All colors are decoded in one bytes.fromhex call and scaled to the
+        0-1 range together, with alpha set to 1.
+        """
+        rgb = np.frombuffer(bytes.fromhex(hex_digits), dtype=np.uint8).reshape(-1, 3)
+        rgba = np.ones((len(rgb), 4), dtype=np.float32)
+        rgba[:, :3] = rgb * np.float32(1.0 / 255.0)
+        return rgba